@@ -8,9 +8,17 @@ def main():
     parser = argparse.ArgumentParser(description='Pandas MCP Server')
     parser.add_argument('--data-path',
                        help='Path to CSV/JSON/Excel file')
+    parser.add_argument('--columns',
+                       help='Comma separated list of columns to load, defaults to all columns')
     
     args = parser.parse_args()
-    asyncio.run(server.main(args.data_path))
+    columns = [column.strip() for column in args.columns.split(',')] if args.columns else None
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(server.main(args.data_path, columns=columns))
+    else:
+        uvloop.run(server.main(args.data_path, columns=columns))
 
 
 # Optionally expose other important items at package level
@@ -1,16 +1,42 @@
 import os
 import sys
+import asyncio
+import threading
+import fastjsonschema
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
 import pandas as pd
 import logging
 from io import BytesIO
-from base64 import b64encode
 from pathlib import Path
+from functools import lru_cache
 from mcp.server.models import InitializationOptions
 import mcp.types as types
 from mcp.server import NotificationOptions, Server
 import mcp.server.stdio
 from pydantic import AnyUrl
 from typing import Any
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+try:
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.feather
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
 # reconfigure UnicodeEncodeError prone default (i.e. windows-1252) to utf-8
 if sys.platform == "win32" and os.environ.get('PYTHONIOENCODING') is None:
@@ -19,7 +45,8 @@ if sys.platform == "win32" and os.environ.get('PYTHONIOENCODING') is None:
     sys.stderr.reconfigure(encoding="utf-8")
 
 logger = logging.getLogger('mcp_pandas')
-logger.setLevel(logging.DEBUG)
+# Debug records for every request are only built when asked for, e.g. MCP_LOG_LEVEL=DEBUG
+logger.setLevel(os.environ.get("MCP_LOG_LEVEL", "INFO").upper())
 logger.info("Starting MCP Pandas Server")
 
 PROMPT_TEMPLATE = """
@@ -104,19 +131,91 @@ Start your first message fully in character with something like "Oh, Hey there!
 """
 server = Server("pandas-manager")
 df: pd.DataFrame
+# String form of df.shape, refreshed by load_data
+_SHAPE_STR: str
+# Column names of df for O(1) membership checks, refreshed by load_data
+_COLS: frozenset[str] = frozenset()
+# Column means computed by the average tool, cleared by load_data
+_AVG_CACHE: dict[str, float] = {}
+
+# Off-screen figure reused by every plot call instead of creating a new pyplot figure each time,
+# tools run in worker threads so drawing on it is serialised by _FIG_LOCK
+_FIG = Figure()
+_CANVAS = FigureCanvasAgg(_FIG)
+_FIG_LOCK = threading.Lock()
+
+if njit is not None:
+    # "reassoc" lets LLVM vectorise the sum but, unlike fastmath=True, keeps the NaN checks
+    @njit(cache=True, parallel=True, fastmath={"reassoc"})
+    def _nanmean(values):
+        total = 0.0
+        count = 0
+        for i in prange(values.size):
+            if not np.isnan(values[i]):
+                total += values[i]
+                count += 1
+        return total / count if count else np.nan
+
+    # Compile up front for the common dtypes only, each one adds to the first start.
+    # The narrower integers _downcast produces compile on their first average call instead.
+    for dtype in (np.float64, np.float32, np.int64):
+        _nanmean(np.zeros(1, dtype=dtype))
+else:
+    _nanmean = None
+
+# numba's default workqueue threading layer can't launch parallel kernels from two threads at once
+_NANMEAN_LOCK = threading.Lock()
+
+
+def _column_mean(column: pd.Series) -> float:
+    values = column.to_numpy()
+    if _nanmean is not None and values.dtype.kind in "iuf":
+        with _NANMEAN_LOCK:
+            return _nanmean(values)
+    if values.dtype == np.float32:
+        # pandas sums float32 columns in float32, which drifts badly on long columns
+        return column.astype(np.float64).mean()
+    return column.mean()
+
+
+@lru_cache(maxsize=64)
+def _plot(kind: str, x: str | None, y: str | None, title: str) -> str:
+    """Render a plot of the DataFrame and return it as a base64 encoded PNG, cleared by load_data"""
+    out = BytesIO()
+    with _FIG_LOCK:
+        _FIG.clear()
+        ax = _FIG.add_subplot()
+        if x and y:
+            df.plot(kind=kind, x=x, y=y, title=title, ax=ax)
+        else:
+            df.plot(kind=kind, title=title, ax=ax)
+        # zlib level 1 encodes much faster than the default level 6 for a slightly larger PNG
+        _CANVAS.print_png(out, pil_kwargs={"compress_level": 1})
+    # Encode straight from the BytesIO buffer rather than copying it out with read()
+    return b64encode(out.getbuffer()).decode('utf-8')
+
+
+def _average(column: str) -> float:
+    """Return the mean of a column, computing it at most once per loaded DataFrame"""
+    if column not in _AVG_CACHE:
+        _AVG_CACHE[column] = _column_mean(df[column])
+    return _AVG_CACHE[column]
+
+
+_RESOURCES = [
+    types.Resource(
+        uri=AnyUrl("memo://shape"),
+        name="DataFrame Shape",
+        description="The shape of the DataFrame",
+        mimeType="text/plain",
+    )
+]
 
 
 @server.list_resources()
 async def handle_list_resources() -> list[types.Resource]:
     logger.debug("Handling list_resources request")
-    return [
-        types.Resource(
-            uri=AnyUrl("memo://shape"),
-            name="DataFrame Shape",
-            description="The shape of the DataFrame",
-            mimeType="text/plain",
-        )
-    ]
+    return _RESOURCES
 
 
 @server.read_resource()
@@ -126,12 +225,11 @@ async def handle_read_resource(uri: AnyUrl) -> str:
         logger.error("Unsupported URI scheme: %s", uri.scheme)
         raise ValueError(f"Unsupported URI scheme: {uri.scheme}")
 
-    path = str(uri).replace("memo://", "")
-    if not path or path != "shape":
-        logger.error(f"Unknown resource path: {path}")
-        raise ValueError(f"Unknown resource path: {path}")
+    if uri.host != "shape" or uri.path:
+        logger.error("Unknown resource path: %s", uri)
+        raise ValueError(f"Unknown resource path: {uri}")
 
-    return str(df.shape)
+    return _SHAPE_STR
 
 
 @server.list_prompts()
@@ -142,56 +240,65 @@ async def handle_list_prompts() -> list[types.Prompt]:
 
 @server.get_prompt()
 async def handle_get_prompt(name: str, arguments: dict[str, str] | None) -> types.GetPromptResult:
-    logger.debug(f"Handling get_prompt request for {name} with args {arguments}")
+    logger.debug("Handling get_prompt request for %s with args %s", name, arguments)
+
+
+# Tool definitions are static, build them once instead of on every list_tools request
+_TOOLS = [
+    types.Tool(
+        name="plot",
+        description="Plot a graph from the DataFrame",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "kind": {
+                    "type": "string",
+                    "description": "Type of plot to create (e.g., bar, line, scatter)",
+                    "enum": ["bar", "line", "scatter"],
+                },
+                "x": {
+                    "type": "string",
+                    "description": "Column name for x-axis",
+                },
+                "y": {
+                    "type": "string",
+                    "description": "Column name for y-axis",
+                },
+                "title": {
+                    "type": "string",
+                    "description": "Title of the plot",
+                },
+            },
+            "required": ["kind"],
+        },
+    ),
+    # Average of column
+    types.Tool(
+        name="average",
+        description="Calculate the average of a column",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "column": {
+                    "type": "string",
+                    "description": "Column name to calculate the average for",
+                },
+            },
+            "required": ["column"],
+        },
+    ),
+]
+
+
+# Argument validators generated from each tool's inputSchema
+_VALIDATORS = {tool.name: fastjsonschema.compile(tool.inputSchema) for tool in _TOOLS}
 
 
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """List available tools"""
-    return [
-        types.Tool(
-            name="plot",
-            description="Plot a graph from the DataFrame",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "kind": {
-                        "type": "string",
-                        "description": "Type of plot to create (e.g., bar, line, scatter)",
-                        "enum": ["bar", "line", "scatter"],
-                    },
-                    "x": {
-                        "type": "string",
-                        "description": "Column name for x-axis",
-                    },
-                    "y": {
-                        "type": "string",
-                        "description": "Column name for y-axis",
-                    },
-                    "title": {
-                        "type": "string",
-                        "description": "Title of the plot",
-                    },
-                },
-                "required": ["kind"],
-            },
-        ),
-        # Average of column
-        types.Tool(
-            name="average",
-            description="Calculate the average of a column",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "column": {
-                        "type": "string",
-                        "description": "Column name to calculate the average for",
-                    },
-                },
-                "required": ["column"],
-            },
-        ),
-    ]
+    return _TOOLS
+
 
 @server.call_tool()
 async def handle_call_tool(
@@ -201,62 +308,205 @@ async def handle_call_tool(
     try:
         if not arguments:
             raise ValueError("Missing arguments")
-        
+        if name not in _VALIDATORS:
+            raise ValueError(f"Unknown tool: {name}")
+        _VALIDATORS[name](arguments)
+
         if name == "plot":
-            kind = arguments.get("kind", "bar")
+            kind = arguments["kind"]
             x = arguments.get("x")
             y = arguments.get("y")
             title = arguments.get("title", "Plot")
-            if kind not in ["bar", "line", "scatter"]:
-                raise ValueError(f"Unsupported plot type: {kind}")
-            if x and y:
-                if x not in df.columns or y not in df.columns:
-                    raise ValueError(f"Columns '{x}' or '{y}' not found in DataFrame")
-                plot = df.plot(kind=kind, x=x, y=y, title=title).get_figure()
-            else:
-                plot = df.plot(kind=kind, title=title).get_figure()
-
-            out = BytesIO()
-            plot.savefig(out, format="png")
-            out.seek(0)
-            plot_data = out.read()
-            out.close()
+            if x and y and (x not in _COLS or y not in _COLS):
+                raise ValueError(f"Columns '{x}' or '{y}' not found in DataFrame")
+            # Rendering and averaging are CPU bound, run them off the event loop
+            plot_data = await asyncio.to_thread(_plot, kind, x, y, title)
             return [
                 types.TextContent(type="text", text=f"Generated {kind} plot"),
-                types.ImageContent(type='image', mimeType="image/png", data=b64encode(plot_data).decode('utf-8'))
+                types.ImageContent(type='image', mimeType="image/png", data=plot_data)
             ]
         elif name == "average":
-            column = arguments.get("column")
-            if column not in df.columns:
+            column = arguments["column"]
+            if column not in _COLS:
                 raise ValueError(f"Column '{column}' not found in DataFrame")
-            average_value = round(df[column].mean(), 3)
+            average_value = round(await asyncio.to_thread(_average, column), 3)
             return [types.TextContent(type="text", text=f"Average of {column}: {average_value}")]
 
     except Exception as e:
         return [types.TextContent(type="text", text=f"Error: {str(e)}")]
 
 
-def load_data(data_path: str) -> None:
-    global df
-    logger.info(f"Loading data from {data_path}")
+# Stored in the Feather sidecar's schema metadata, sidecars with any other value are re-parsed.
+# Bump the format number whenever _read_file or _downcast change the frames they produce.
+_CACHE_VERSION_KEY = b"mcp_pandas.cache_version"
+_CACHE_VERSION = f"2;pandas={pd.__version__};pyarrow={pyarrow.__version__ if pyarrow else None}".encode()
+
+
+def _check_columns(columns: list[str] | None, available: list[str]) -> None:
+    known = set(available)
+    missing = [column for column in columns or [] if column not in known]
+    if missing:
+        message = f"Unknown columns: {', '.join(missing)}. Available columns: {', '.join(map(str, available))}"
+        logger.error(message)
+        raise ValueError(message)
+
+
+def _missing_as_nan(frame: pd.DataFrame) -> pd.DataFrame:
+    """Replace the None that Arrow and read_json give for missing text with the NaN the C parser gives.
+
+    Columns left with nothing but missing values become float64, as they do in the C parser.
+    """
+    for column in frame.columns[frame.dtypes == object]:
+        values = frame[column]
+        frame[column] = values.where(values.notna(), np.nan).infer_objects()
+    return frame
+
+
+def _read_csv_arrow(data_path: str, columns: list[str] | None = None) -> pd.DataFrame | None:
+    """Parse a CSV file with the multithreaded Arrow reader, straight out of a memory map.
+
+    Arrow infers ISO dates and timestamps as date/datetime values where the C parser keeps the
+    original text, so those columns are read as strings to give the same frame either way.
+    Returns None for files Arrow would read differently from the C parser.
+    """
+    try:
+        with pyarrow.memory_map(data_path) as source:
+            # Only the first block is parsed to find which columns Arrow would treat as temporal
+            schema = pyarrow.csv.open_csv(source).schema
+            if "" in schema.names or len(set(schema.names)) != len(schema.names):
+                # The C parser renames these to "Unnamed: 0" and "a.1", Arrow keeps them as they are
+                return None
+            _check_columns(columns, schema.names)
+            source.seek(0)
+            convert_options = pyarrow.csv.ConvertOptions(
+                column_types={
+                    field.name: pyarrow.string() for field in schema if pyarrow.types.is_temporal(field.type)
+                },
+                include_columns=columns or [],
+                # Match the C parser, which also treats empty strings as missing in text columns
+                strings_can_be_null=True,
+            )
+            table = pyarrow.csv.read_csv(source, convert_options=convert_options)
+    except pyarrow.ArrowInvalid as e:
+        # e.g. rows with fewer fields than the header, which the C parser pads with NaN
+        logger.info(f"Falling back to the C parser for {data_path}: {e}")
+        return None
+    frame = table.to_pandas()
+    # Arrow has no uint64 inference and reads integers past int64 as floats, the C parser keeps them exact
+    if (frame.select_dtypes("float").abs().max() >= 2**63).any():
+        return None
+    return frame
+
+
+def _read_file(data_path: str, columns: list[str] | None = None) -> pd.DataFrame:
     file_extension = Path(data_path).suffix.lower()
     if file_extension == ".csv":
-        df = pd.read_csv(data_path)
+        frame = _read_csv_arrow(data_path, columns) if pyarrow is not None else None
+        if frame is None:
+            if columns is not None:
+                _check_columns(columns, list(pd.read_csv(data_path, nrows=0).columns))
+            frame = pd.read_csv(data_path, memory_map=True, usecols=columns)
     elif file_extension == ".json":
-        df = pd.read_json(data_path)
+        frame = pd.read_json(data_path)
+        if columns is not None:
+            _check_columns(columns, list(frame.columns))
     elif file_extension in [".xls", ".xlsx"]:
-        df = pd.read_excel(data_path)
+        try:
+            frame = pd.read_excel(data_path, engine="calamine", usecols=columns)
+        except ImportError:
+            frame = pd.read_excel(data_path, usecols=columns)
     else:
         logger.error(f"Unsupported file format: {file_extension}")
         raise ValueError(f"Unsupported file format: {file_extension}")
-    logger.info(f"Loaded data from {data_path} with shape: {df.shape}")
+    if columns is not None:
+        # usecols keeps the file's order, the Arrow reader and the cache keep the order asked for
+        frame = frame[columns]
+    return _missing_as_nan(frame)
+
+
+def _downcast(frame: pd.DataFrame) -> pd.DataFrame:
+    """Shrink column dtypes in place so scans read less memory.
+
+    Integers move to the narrowest type that holds them and floats move to float32 only when
+    every value survives the round trip. Text columns with mostly repeated values become
+    categoricals.
+    """
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_integer_dtype(values):
+            frame[column] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_float_dtype(values):
+            downcast = pd.to_numeric(values, downcast="float")
+            if downcast.astype(values.dtype).equals(values):
+                frame[column] = downcast
+        elif values.dtype == object and len(values) and values.nunique() / len(values) < 0.5:
+            frame[column] = values.astype("category")
+    return frame
+
+
+def _read_cache(cache: Path, columns: list[str] | None = None) -> pd.DataFrame | None:
+    """Read the Feather sidecar, or return None if it is unreadable or from another cache version"""
+    try:
+        with pyarrow.memory_map(str(cache)) as source:
+            schema = pyarrow.ipc.open_file(source).schema
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache {cache}: {e}")
+        return None
+    if (schema.metadata or {}).get(_CACHE_VERSION_KEY) != _CACHE_VERSION:
+        logger.info(f"Ignoring cache {cache} written by a different version")
+        return None
+    # A misspelled column is the caller's mistake, not a broken cache
+    _check_columns(columns, schema.names)
+    try:
+        return _missing_as_nan(pyarrow.feather.read_table(cache, columns=columns).to_pandas())
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache {cache}: {e}")
+        return None
+
+
+def _load_frame(data_path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    if pyarrow is None:
+        return _downcast(_read_file(data_path, columns))
+
+    source = Path(data_path)
+    # Feather sidecar written on first load, reused until the source file changes.
+    # It always holds every column so any selection of columns can be read back from it.
+    cache = source.with_suffix(source.suffix + ".feather")
+    if cache.exists() and cache.stat().st_mtime >= source.stat().st_mtime:
+        frame = _read_cache(cache, columns)
+        if frame is not None:
+            logger.info(f"Using cached data from {cache}")
+            return frame
+
+    frame = _downcast(_read_file(data_path, columns))
+    if columns is not None:
+        return frame
+    try:
+        table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({**table.schema.metadata, _CACHE_VERSION_KEY: _CACHE_VERSION})
+        pyarrow.feather.write_feather(table, cache, compression="zstd")
+    except Exception as e:
+        logger.warning(f"Could not write cache {cache}: {e}")
+        cache.unlink(missing_ok=True)
+    return frame
+
+
+def load_data(data_path: str, columns: list[str] | None = None) -> None:
+    global df, _SHAPE_STR, _COLS
+    logger.info(f"Loading data from {data_path}")
+    df = _load_frame(data_path, columns)
+    _SHAPE_STR = str(df.shape)
+    _COLS = frozenset(df.columns)
+    _AVG_CACHE.clear()
+    _plot.cache_clear()
+    logger.info(f"Loaded data from {data_path} with shape: {_SHAPE_STR}")
 
 
-async def main(data_path: str, mode: str = "stdio") -> None | Server:
+async def main(data_path: str, mode: str = "stdio", columns: list[str] | None = None) -> None | Server:
     global df
     logger.info(f"Starting Pandas MCP Server with path: {data_path}")
 
-    load_data(data_path)
+    load_data(data_path, columns)
     
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
         logger.info("Server running with stdio transport")
@@ -2,6 +2,18 @@ import mcp_pandas.server as mcp_server
 import pytest
 import base64
 import os
+import shutil
+import warnings
+import numpy as np
+import pandas as pd
+from pydantic import AnyUrl
+
+
+@pytest.fixture
+def statements_path(tmp_path):
+    """Copy of the Statements workbook, so its feather sidecar isn't written into the repo."""
+    return shutil.copy("src/tests/data/Statements.xlsx", tmp_path)
+
 
 @pytest.mark.asyncio
 async def test_main():
@@ -16,10 +28,10 @@ async def test_main():
 @pytest.mark.parametrize("data_path", [
     "src/tests/data/Statements.xlsx",
 ])
-async def test_plot_generation(data_path):
+async def test_plot_generation(data_path, tmp_path):
     """Test basic plot generation."""
     # Test the server with a simple function
-    mcp_server.load_data(data_path)
+    mcp_server.load_data(shutil.copy(data_path, tmp_path))
     data = await mcp_server.handle_call_tool("plot", {"kind": "bar"})
     assert data is not None
     assert data[1].type == "image"
@@ -28,12 +40,261 @@ async def test_plot_generation(data_path):
     assert image_data is not None
     base64_bytes = base64.b64decode(image_data)
     # Write to png file
-    with open("src/tests/test_plot.png", "wb") as f:
+    with open(tmp_path / "test_plot.png", "wb") as f:
         f.write(base64_bytes)
     # Check if the file is created
-    assert os.path.exists("src/tests/test_plot.png")
+    assert os.path.exists(tmp_path / "test_plot.png")
 
 
     avg = await mcp_server.handle_call_tool("average", {"column": "Total amount"})
     assert avg is not None
     assert avg[0].text == "Average of Total amount: -0.23"
+
+
+def test_load_data_writes_feather_cache(tmp_path):
+    """Test the feather sidecar is written and reused until the source changes."""
+    pytest.importorskip("pyarrow")
+    data_path = tmp_path / "data.csv"
+    data_path.write_text("a,b\n1,2\n3,4\n")
+    cache = tmp_path / "data.csv.feather"
+
+    mcp_server.load_data(str(data_path))
+    assert cache.exists()
+    assert mcp_server.df["a"].tolist() == [1, 3]
+
+    # A newer source file invalidates the cache
+    data_path.write_text("a,b\n5,6\n")
+    os.utime(data_path, (cache.stat().st_mtime + 1, cache.stat().st_mtime + 1))
+    mcp_server.load_data(str(data_path))
+    assert mcp_server.df["a"].tolist() == [5]
+
+    # An up to date cache is preferred over the source
+    data_path.write_text("a,b\n7,8\n")
+    os.utime(data_path, (cache.stat().st_mtime - 1, cache.stat().st_mtime - 1))
+    mcp_server.load_data(str(data_path))
+    assert mcp_server.df["a"].tolist() == [5]
+
+
+def test_load_data_ignores_cache_from_other_version(tmp_path, monkeypatch):
+    """Test a sidecar written by another cache version is re-parsed and replaced."""
+    pytest.importorskip("pyarrow")
+    data_path = tmp_path / "data.csv"
+    data_path.write_text("a,b\n1,2\n")
+    cache = tmp_path / "data.csv.feather"
+    mcp_server.load_data(str(data_path))
+
+    data_path.write_text("a,b\n5,6\n")
+    os.utime(data_path, (cache.stat().st_mtime - 1, cache.stat().st_mtime - 1))
+    monkeypatch.setattr(mcp_server, "_CACHE_VERSION", b"other")
+    mcp_server.load_data(str(data_path))
+    assert mcp_server.df["a"].tolist() == [5]
+
+
+@pytest.mark.parametrize(
+    "file_name, content",
+    [
+        ("data.csv", "a,b\n1,x\n2,\n3,y\n4,z\n"),
+        ("data.json", '[{"a": 1, "b": "x"}, {"a": 2, "b": null}, {"a": 3, "b": "y"}, {"a": 4, "b": "z"}]'),
+    ],
+)
+def test_load_data_cache_keeps_missing_values(tmp_path, file_name, content):
+    """Test missing text reads back from the cache exactly as it was first parsed."""
+    pytest.importorskip("pyarrow")
+    data_path = tmp_path / file_name
+    data_path.write_text(content)
+
+    mcp_server.load_data(str(data_path))
+    first = mcp_server.df
+    assert (tmp_path / f"{file_name}.feather").exists()
+    mcp_server.load_data(str(data_path))
+    second = mcp_server.df
+
+    pd.testing.assert_frame_equal(first.isna(), second.isna())
+    assert list(map(repr, first["b"])) == list(map(repr, second["b"])) == ["'x'", "nan", "'y'", "'z'"]
+
+
+def test_load_data_without_pyarrow_skips_cache(tmp_path, monkeypatch, caplog):
+    """Test no sidecar is attempted when pyarrow isn't installed."""
+    monkeypatch.setattr(mcp_server, "pyarrow", None)
+    data_path = tmp_path / "data.csv"
+    data_path.write_text("a,b\n1,2\n")
+
+    mcp_server.load_data(str(data_path))
+    assert mcp_server.df["a"].tolist() == [1]
+    assert not (tmp_path / "data.csv.feather").exists()
+    assert not [record for record in caplog.records if record.levelname == "WARNING"]
+
+
+@pytest.mark.asyncio
+async def test_read_shape_resource(statements_path):
+    """Test the shape resource follows the loaded data."""
+    mcp_server.load_data(statements_path)
+    assert await mcp_server.handle_read_resource(AnyUrl("memo://shape")) == "(20, 7)"
+    with pytest.raises(ValueError):
+        await mcp_server.handle_read_resource(AnyUrl("memo://insights"))
+
+
+def test_load_data_downcasts_columns(tmp_path):
+    """Test numeric columns are narrowed without losing values."""
+    data_path = tmp_path / "data.csv"
+    data_path.write_text("count,exact,inexact,kind\n1,0.5,0.1,a\n2,1.5,0.2,a\n3,2.5,0.3,b\n4,3.5,0.4,a\n5,4.5,0.5,b\n")
+
+    mcp_server.load_data(str(data_path))
+    assert mcp_server.df["count"].dtype == "int8"
+    assert mcp_server.df["exact"].dtype == "float32"
+    assert mcp_server.df["inexact"].dtype == "float64"
+    assert mcp_server.df["inexact"].tolist() == [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert mcp_server.df["kind"].dtype == "category"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name,arguments,error", [
+    ("plot", {"kind": "pie"}, "data.kind must be one of"),
+    ("plot", {"title": "Plot"}, "data must contain ['kind']"),
+    ("average", {"column": 1}, "data.column must be string"),
+    ("median", {"column": "Total amount"}, "Unknown tool: median"),
+])
+async def test_call_tool_validates_arguments(name, arguments, error, statements_path):
+    """Test tool arguments are checked against the tool's input schema."""
+    mcp_server.load_data(statements_path)
+    data = await mcp_server.handle_call_tool(name, arguments)
+    assert data[0].text.startswith("Error: ")
+    assert error in data[0].text
+
+
+@pytest.mark.asyncio
+async def test_plot_cache_cleared_on_load(tmp_path):
+    """Test repeated plots are served from the cache until new data is loaded."""
+    data_path = tmp_path / "data.csv"
+    data_path.write_text("a,b\n1,2\n3,4\n")
+    mcp_server.load_data(str(data_path))
+
+    first = await mcp_server.handle_call_tool("plot", {"kind": "line", "x": "a", "y": "b"})
+    second = await mcp_server.handle_call_tool("plot", {"kind": "line", "x": "a", "y": "b"})
+    assert first[1].data == second[1].data
+    assert mcp_server._plot.cache_info().hits == 1
+
+    mcp_server.load_data(str(data_path))
+    assert mcp_server._plot.cache_info().currsize == 0
+
+
+@pytest.mark.parametrize("file_name,content", [
+    ("data.csv", "a,b,c\n1,2,3\n4,5,6\n"),
+    ("data.json", '[{"a": 1, "b": 2, "c": 3}, {"a": 4, "b": 5, "c": 6}]'),
+])
+@pytest.mark.parametrize("with_pyarrow", [True, False])
+def test_load_data_selected_columns(tmp_path, monkeypatch, file_name, content, with_pyarrow):
+    """Test only the requested columns are loaded, in the order asked for, with or without a cache."""
+    if not with_pyarrow:
+        monkeypatch.setattr(mcp_server, "pyarrow", None)
+    data_path = tmp_path / file_name
+    data_path.write_text(content)
+
+    mcp_server.load_data(str(data_path), ["c", "a"])
+    assert list(mcp_server.df.columns) == ["c", "a"]
+    assert mcp_server._COLS == {"a", "c"}
+
+    # A full load writes the cache, later selections are read back from it
+    mcp_server.load_data(str(data_path))
+    assert list(mcp_server.df.columns) == ["a", "b", "c"]
+    mcp_server.load_data(str(data_path), ["c", "a"])
+    assert list(mcp_server.df.columns) == ["c", "a"]
+    mcp_server.load_data(str(data_path), ["b"])
+    assert list(mcp_server.df.columns) == ["b"]
+    assert mcp_server.df["b"].tolist() == [2, 5]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Date,Timestamp,Name,Amount\n2024-01-02,2024-01-02T10:00:00,a,1.5\n2024-02-03,2024-02-03T11:30:00,,\n",
+        "a,b\n1,\n2,\n",
+        "a,b,c\n1,2,3\n4,5\n",
+        "a,a,b\n1,2,3\n4,5,6\n",
+        ",a\n0,1\n1,2\n",
+        ",,a\n0,1,2\n1,2,3\n",
+        "a,b\n18446744073709551615,1\n0,2\n",
+    ],
+    ids=["dates", "empty-column", "short-row", "duplicate-header", "blank-header", "blank-headers", "uint64"],
+)
+def test_read_csv_matches_c_parser(tmp_path, text):
+    """Test the Arrow CSV reader gives the same frame as the pandas C parser."""
+    pytest.importorskip("pyarrow")
+    data_path = tmp_path / "data.csv"
+    data_path.write_text(text)
+    expected = pd.read_csv(data_path)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        frame = mcp_server._read_file(str(data_path))
+    pd.testing.assert_frame_equal(frame, expected)
+    assert mcp_server._downcast(frame).shape == expected.shape
+    if "Date" in frame:
+        assert isinstance(frame["Date"][0], str)
+
+
+@pytest.mark.asyncio
+async def test_average_cache_cleared_on_load(tmp_path):
+    """Test repeated averages are served from the cache until new data is loaded."""
+    data_path = tmp_path / "data.csv"
+    data_path.write_text("a,b\n1,2\n3,4\n")
+    mcp_server.load_data(str(data_path))
+
+    avg = await mcp_server.handle_call_tool("average", {"column": "a"})
+    assert avg[0].text == "Average of a: 2.0"
+    assert mcp_server._AVG_CACHE == {"a": 2.0}
+    mcp_server._AVG_CACHE["a"] = 10.0
+    avg = await mcp_server.handle_call_tool("average", {"column": "a"})
+    assert avg[0].text == "Average of a: 10.0"
+
+    other_path = tmp_path / "other.csv"
+    other_path.write_text("a,b\n5,6\n7,8\n")
+    mcp_server.load_data(str(other_path))
+    assert mcp_server._AVG_CACHE == {}
+    avg = await mcp_server.handle_call_tool("average", {"column": "a"})
+    assert avg[0].text == "Average of a: 6.0"
+
+
+def test_average_of_float32_column_without_numba(monkeypatch):
+    """Test float32 columns are averaged in float64 when numba isn't available."""
+    monkeypatch.setattr(mcp_server, "_nanmean", None)
+    values = np.random.default_rng(0).integers(0, 4_000_000, 2_000_000) / 4
+    column = mcp_server._downcast(pd.DataFrame({"a": values}))["a"]
+    assert column.dtype == np.float32
+    assert mcp_server._column_mean(column) == pytest.approx(values.mean(), abs=1e-6)
+
+
+@pytest.mark.parametrize("values", [
+    np.array([1.5, np.nan, 2.25, np.nan, -4.0]),
+    np.array([1.5, np.nan, 2.25], dtype=np.float32),
+    np.array([np.nan, np.nan]),
+    np.arange(-50, 100, dtype=np.int8),
+    np.arange(100_000, dtype=np.int32),
+    np.arange(100_000, dtype=np.int64),
+])
+def test_nanmean_matches_pandas(values):
+    """Test the numba kernel skips NaNs and handles integers the way Series.mean does."""
+    numba = pytest.importorskip("numba")
+    if values.dtype in (np.float64, np.float32, np.int64):
+        # Compiled during import rather than on this call
+        assert (numba.typeof(values),) in mcp_server._nanmean.signatures
+    expected = pd.Series(values).astype(np.float64).mean()
+    assert mcp_server._nanmean(values) == pytest.approx(expected, nan_ok=True)
+
+
+@pytest.mark.parametrize("file_name,content", [
+    ("data.csv", "a,b,c\n1,2,3\n4,5,6\n"),
+    ("data.json", '[{"a": 1, "b": 2, "c": 3}, {"a": 4, "b": 5, "c": 6}]'),
+])
+def test_load_data_unknown_columns(tmp_path, caplog, file_name, content):
+    """Test a misspelled column is reported as such, with or without a cache."""
+    data_path = tmp_path / file_name
+    data_path.write_text(content)
+
+    with pytest.raises(ValueError, match="Unknown columns: nope"):
+        mcp_server.load_data(str(data_path), ["a", "nope"])
+
+    # Once the cache is written the error is the same, and the cache isn't blamed for it
+    mcp_server.load_data(str(data_path))
+    with pytest.raises(ValueError, match="Unknown columns: nope"):
+        mcp_server.load_data(str(data_path), ["a", "nope"])
+    assert not [record for record in caplog.records if record.levelname == "WARNING"]